@@ -1,36 +1,231 @@
+import atexit
+import functools
+import hashlib
 import html
 import os
-import random
+import queue
+import re
 import sqlite3
 import string
-from datetime import datetime
-from urllib.parse import parse_qs, urlparse
-from wsgiref.simple_server import make_server
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlparse
+from wsgiref.simple_server import WSGIServer, make_server
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "shorturl.db")
+CSS_PATH = os.path.join(BASE_DIR, "static", "style.css")
+CSS_CACHE_CONTROL = "public, max-age=86400"
 CODE_LENGTH = 6
 MAX_GENERATION_ATTEMPTS = 20
+BUSY_TIMEOUT_MS = 5000
+POOL_SIZE = 8
+SERVER_THREADS = 8
+SERVER_LISTEN_BACKLOG = 128
+# INSERT ... ON CONFLICT ... RETURNING needs SQLite 3.35+.
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35)
+CLICK_FLUSH_INTERVAL = 1.0
+CLICK_FLUSH_THRESHOLD = 256
+URL_CACHE_SIZE = 8192
+SUBMIT_CACHE_SIZE = 16384
+NORMALIZE_CACHE_SIZE = 4096
+NORMALIZE_CACHE_MAX_INPUT = 2048
+CODE_ALPHABET = string.ascii_letters + string.digits
+MAX_FORM_FIELDS = 16
+
+_CODE_CHARS = frozenset(CODE_ALPHABET)
+# Hosts made only of these characters need no HTML escaping.
+_HOST_RE = re.compile(r"[A-Za-z0-9.:-]+")
+# Maps every byte value b to CODE_ALPHABET[b % 62].
+_CODE_TABLE = bytes(CODE_ALPHABET.encode("ascii")[b % len(CODE_ALPHABET)] for b in range(256))
+
+_POOL = queue.LifoQueue(maxsize=POOL_SIZE)
+_POOL_STATS = {"opens": 0, "reuses": 0}
+
+_click_buffer = Counter()
+_click_lock = threading.Lock()
+_click_timer = None
+_pending_clicks = 0
+# Set by init_db once original_url is known to have a unique index.
+_unique_original_url = False
+
+
+# Unlike functools.lru_cache, this can be primed and updated per key.
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# code -> original_url; the mapping never changes once a row is inserted.
+_code_cache = LRUCache(URL_CACHE_SIZE)
+# original_url -> code, so repeat submissions skip the existence check.
+_url_cache = LRUCache(SUBMIT_CACHE_SIZE)
+
+
+def _connect() -> sqlite3.Connection:
+    db = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    db.row_factory = sqlite3.Row
+    # synchronous/busy_timeout/temp_store are per-connection settings.
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    db.execute("PRAGMA temp_store=MEMORY")
+    return db
+
+
+@contextmanager
+def get_conn():
+    if DB_PATH == ":memory:":
+        # Every in-memory connection is a separate database, so pooling it
+        # would only hide state between callers.
+        db = _connect()
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+
+    try:
+        db = _POOL.get_nowait()
+        _POOL_STATS["reuses"] += 1
+    except queue.Empty:
+        db = _connect()
+        _POOL_STATS["opens"] += 1
+
+    try:
+        yield db
+    finally:
+        if db.in_transaction:
+            db.rollback()
+        try:
+            _POOL.put_nowait(db)
+        except queue.Full:
+            db.close()
+
+
+def close_pool() -> None:
+    while True:
+        try:
+            _POOL.get_nowait().close()
+        except queue.Empty:
+            return
+
+
+def pool_stats() -> dict:
+    return dict(_POOL_STATS, idle=_POOL.qsize(), maxsize=POOL_SIZE)
 
 
 def init_db() -> None:
-    with sqlite3.connect(DB_PATH) as db:
+    global _unique_original_url
+    # Pooled connections and buffered clicks belong to the previous DB_PATH.
+    close_pool()
+    _take_clicks()
+    _code_cache.clear()
+    _url_cache.clear()
+    with get_conn() as db:
+        if DB_PATH != ":memory:":
+            # WAL is persisted in the database file, so setting it once here
+            # lets readers keep serving redirects while a writer is active.
+            db.execute("PRAGMA journal_mode=WAL")
         db.execute(
             """
             CREATE TABLE IF NOT EXISTS urls (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 code TEXT UNIQUE NOT NULL,
                 original_url TEXT NOT NULL,
-                created_at TEXT NOT NULL,
+                created_at INTEGER NOT NULL,
                 clicks INTEGER NOT NULL DEFAULT 0
             )
             """
         )
-        db.execute("CREATE INDEX IF NOT EXISTS idx_urls_code ON urls(code)")
-        db.execute("CREATE INDEX IF NOT EXISTS idx_urls_original ON urls(original_url)")
+        # Rows written before created_at became a Unix timestamp hold UTC
+        # ISO-8601 text; convert them so every row uses the same format.
+        # Unparseable values are left alone rather than blocking startup.
+        db.execute(
+            "UPDATE urls SET created_at = CAST(strftime('%s', created_at) AS INTEGER) "
+            "WHERE created_at GLOB '*-*' AND strftime('%s', created_at) IS NOT NULL"
+        )
+        # code is UNIQUE and already has an implicit index.
+        db.execute("DROP INDEX IF EXISTS idx_urls_code")
+        # A unique index (rather than a table constraint) also upgrades
+        # databases created before original_url had to be unique. Older
+        # databases may hold duplicates whose short links must keep working;
+        # those keep the plain index and the select-then-insert path.
+        db.execute("BEGIN IMMEDIATE")
+        duplicate = db.execute(
+            "SELECT 1 FROM urls GROUP BY original_url HAVING COUNT(*) > 1 LIMIT 1"
+        ).fetchone()
+        if duplicate is None:
+            db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_urls_original_unique ON urls(original_url)")
+            db.execute("DROP INDEX IF EXISTS idx_urls_original")
+        else:
+            db.execute("CREATE INDEX IF NOT EXISTS idx_urls_original ON urls(original_url)")
+        db.execute("COMMIT")
+        _unique_original_url = duplicate is None
+        # COUNT(*) scans the whole table, so keep the total in a counter row.
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS stats (
+                k TEXT PRIMARY KEY,
+                v INTEGER NOT NULL
+            )
+            """
+        )
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("INSERT OR IGNORE INTO stats (k, v) SELECT 'url_count', COUNT(*) FROM urls")
+        db.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS urls_ai AFTER INSERT ON urls BEGIN
+                UPDATE stats SET v = v + 1 WHERE k = 'url_count';
+            END
+            """
+        )
+        db.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS urls_ad AFTER DELETE ON urls BEGIN
+                UPDATE stats SET v = v - 1 WHERE k = 'url_count';
+            END
+            """
+        )
+        db.execute("COMMIT")
+    prime_url_cache()
 
 
-def normalize_url(raw: str) -> str:
+def prime_url_cache() -> None:
+    with get_conn() as db:
+        rows = db.execute(
+            "SELECT code, original_url FROM urls WHERE length(original_url) <= ? ORDER BY id DESC LIMIT ?",
+            (NORMALIZE_CACHE_MAX_INPUT, URL_CACHE_SIZE),
+        ).fetchall()
+    # Insert oldest first so the newest links end up most recently used.
+    for row in reversed(rows):
+        _code_cache.put(row["code"], row["original_url"])
+
+
+def _normalize_impl(raw: str) -> str:
     cleaned = raw.strip()
     if not cleaned:
         return ""
@@ -49,48 +244,171 @@ def normalize_url(raw: str) -> str:
     return cleaned
 
 
+_normalize_cached = functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(_normalize_impl)
+
+
+def normalize_url(raw: str) -> str:
+    # Keep oversized user input out of the cache.
+    if len(raw) > NORMALIZE_CACHE_MAX_INPUT:
+        return _normalize_impl(raw)
+    return _normalize_cached(raw)
+
+
 def generate_code() -> str:
-    alphabet = string.ascii_letters + string.digits
-    return "".join(random.choice(alphabet) for _ in range(CODE_LENGTH))
+    # os.urandom avoids the shared Mersenne Twister state of the random module.
+    return os.urandom(CODE_LENGTH).translate(_CODE_TABLE).decode("ascii")
+
+
+def _upsert_code(db: sqlite3.Connection, original_url: str) -> str:
+    for _ in range(MAX_GENERATION_ATTEMPTS):
+        try:
+            row = db.execute(
+                "INSERT INTO urls (code, original_url, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(original_url) DO UPDATE SET original_url = original_url "
+                "RETURNING code",
+                (generate_code(), original_url, int(time.time())),
+            ).fetchone()
+            return row["code"]
+        except sqlite3.IntegrityError:
+            # Only a code collision gets here; duplicate URLs hit the upsert.
+            continue
 
+    raise RuntimeError("Could not generate a unique short code")
 
-def insert_short_url(original_url: str) -> str:
-    with sqlite3.connect(DB_PATH) as db:
-        db.row_factory = sqlite3.Row
-        existing = db.execute(
-            "SELECT code FROM urls WHERE original_url = ?",
-            (original_url,),
-        ).fetchone()
-        if existing:
-            return existing["code"]
-
-        for _ in range(MAX_GENERATION_ATTEMPTS):
-            code = generate_code()
-            try:
-                db.execute(
-                    "INSERT INTO urls (code, original_url, created_at) VALUES (?, ?, ?)",
-                    (code, original_url, datetime.utcnow().isoformat()),
-                )
-                return code
-            except sqlite3.IntegrityError:
-                continue
+
+def _select_or_insert_code(db: sqlite3.Connection, original_url: str) -> str:
+    existing = db.execute(
+        "SELECT code FROM urls WHERE original_url = ?",
+        (original_url,),
+    ).fetchone()
+    if existing:
+        return existing["code"]
+
+    for _ in range(MAX_GENERATION_ATTEMPTS):
+        code = generate_code()
+        try:
+            db.execute(
+                "INSERT INTO urls (code, original_url, created_at) VALUES (?, ?, ?)",
+                (code, original_url, int(time.time())),
+            )
+            return code
+        except sqlite3.IntegrityError:
+            continue
 
     raise RuntimeError("Could not generate a unique short code")
 
 
-def lookup_original_url(code: str):
-    with sqlite3.connect(DB_PATH) as db:
-        db.row_factory = sqlite3.Row
+def _cacheable(original_url: str) -> bool:
+    # Same bound as normalize_url: oversized URLs would let clients pin
+    # arbitrary amounts of memory in the LRUs.
+    return len(original_url) <= NORMALIZE_CACHE_MAX_INPUT
+
+
+def insert_short_url(original_url: str) -> str:
+    cached = _url_cache.get(original_url)
+    if cached is not None:
+        return cached
+
+    with get_conn() as db:
+        if HAS_RETURNING and _unique_original_url:
+            code = _upsert_code(db, original_url)
+        else:
+            code = _select_or_insert_code(db, original_url)
+
+    if _cacheable(original_url):
+        _code_cache.put(code, original_url)
+        _url_cache.put(original_url, code)
+    return code
+
+
+def _arm_click_timer() -> None:
+    # Caller holds _click_lock.
+    global _click_timer
+    if _click_timer is None:
+        _click_timer = threading.Timer(CLICK_FLUSH_INTERVAL, flush_clicks)
+        _click_timer.daemon = True
+        _click_timer.start()
+
+
+def record_click(code: str) -> None:
+    global _pending_clicks
+    with _click_lock:
+        _click_buffer[code] += 1
+        _pending_clicks += 1
+        # Only the click that reaches the threshold flushes inline; a batch
+        # put back after a failed flush is retried by the timer instead.
+        flush_now = _pending_clicks == CLICK_FLUSH_THRESHOLD
+        if not flush_now:
+            _arm_click_timer()
+    if flush_now:
+        flush_clicks()
+
+
+def _take_clicks() -> list:
+    global _click_timer, _pending_clicks
+    with _click_lock:
+        if _click_timer is not None:
+            _click_timer.cancel()
+            _click_timer = None
+        items = [(count, code) for code, count in _click_buffer.items()]
+        _click_buffer.clear()
+        _pending_clicks = 0
+    return items
+
+
+def _restore_clicks(items: list) -> None:
+    global _pending_clicks
+    with _click_lock:
+        for count, code in items:
+            _click_buffer[code] += count
+            _pending_clicks += count
+        _arm_click_timer()
+
+
+def flush_clicks() -> None:
+    items = _take_clicks()
+    if not items:
+        return
+    # One transaction per flush instead of one fsync per redirect.
+    try:
+        with get_conn() as db:
+            db.execute("BEGIN")
+            db.executemany("UPDATE urls SET clicks = clicks + ? WHERE code = ?", items)
+            db.execute("COMMIT")
+    except sqlite3.Error as exc:
+        # Keep the batch for the next attempt; a redirect that already
+        # resolved must not fail because click bookkeeping did.
+        print(f"Could not flush clicks, will retry: {exc}", file=sys.stderr)
+        _restore_clicks(items)
+
+
+atexit.register(flush_clicks)
+
+
+def _fetch_original(code: str):
+    cached = _code_cache.get(code)
+    if cached is not None:
+        return cached
+    with get_conn() as db:
         row = db.execute("SELECT original_url FROM urls WHERE code = ?", (code,)).fetchone()
-        if row:
-            db.execute("UPDATE urls SET clicks = clicks + 1 WHERE code = ?", (code,))
-            return row["original_url"]
-    return None
+    if row is None:
+        # Misses are not cached: the code may be issued later.
+        return None
+    if _cacheable(row["original_url"]):
+        _code_cache.put(code, row["original_url"])
+    return row["original_url"]
+
+
+def lookup_original_url(code: str):
+    target = _fetch_original(code)
+    if target:
+        record_click(code)
+    return target
 
 
 def count_urls() -> int:
-    with sqlite3.connect(DB_PATH) as db:
-        result = db.execute("SELECT COUNT(*) AS total FROM urls").fetchone()
+    with get_conn() as db:
+        result = db.execute("SELECT v FROM stats WHERE k = 'url_count'").fetchone()
         return int(result[0])
 
 
@@ -116,6 +434,66 @@ def html_page(title: str, content: str) -> str:
 </html>"""
 
 
+HTML_CONTENT_TYPE = "text/html; charset=utf-8"
+
+HOME_CONTENT = """
+<section class='hero'>
+  <h1>Paste the URL to be shortened</h1>
+  <p>Simple, fast, and reliable short link service.</p>
+</section>
+<form method='post' class='card form-card'>
+  <input id='url' name='url' type='text' placeholder='Enter the link here' required>
+  <button type='submit'>Shorten URL</button>
+</form>
+<p class='helper'>Example valid input: <code>https://example.com</code> or <code>example.com/page</code></p>
+"""
+
+URL_ERROR_CONTENT = """
+<section class='hero'>
+  <h1>Invalid URL</h1>
+</section>
+<div class='card error-card'>
+  <p>The URL you entered is not valid.</p>
+  <p>Please make sure it starts with <code>http://</code> or <code>https://</code> (or include a valid domain name).</p>
+  <a class='btn' href='/'>Try Again</a>
+</div>
+"""
+
+NOT_FOUND_CONTENT = """
+<section class='hero'>
+  <h1>404 - Link not found</h1>
+</section>
+<div class='card error-card'>
+  <p>This short URL does not exist or has expired.</p>
+  <a class='btn' href='/'>Create new short URL</a>
+</div>
+"""
+
+# These pages never change, so render and encode them once at import.
+# Header tuples are copied with list() per response: wsgiref insists on a list.
+# The *_BODY lists are shared across requests and must never be mutated.
+_EMPTY_BODY = [b""]
+_HOME_BYTES = html_page("Free URL Shortener", HOME_CONTENT).encode("utf-8")
+_HOME_BODY = [_HOME_BYTES]
+_HOME_HEADERS = (("Content-Type", HTML_CONTENT_TYPE), ("Content-Length", str(len(_HOME_BYTES))))
+_ERROR_BYTES = html_page("URL error", URL_ERROR_CONTENT).encode("utf-8")
+_ERROR_BODY = [_ERROR_BYTES]
+_ERROR_HEADERS = (("Content-Type", HTML_CONTENT_TYPE), ("Content-Length", str(len(_ERROR_BYTES))))
+_NOT_FOUND_BYTES = html_page("404 Not Found", NOT_FOUND_CONTENT).encode("utf-8")
+_NOT_FOUND_BODY = [_NOT_FOUND_BYTES]
+_NOT_FOUND_HEADERS = (("Content-Type", HTML_CONTENT_TYPE), ("Content-Length", str(len(_NOT_FOUND_BYTES))))
+
+with open(CSS_PATH, "rb") as fh:
+    _CSS_BYTES = fh.read()
+_CSS_BODY = [_CSS_BYTES]
+_CSS_ETAG = f'"{hashlib.md5(_CSS_BYTES, usedforsecurity=False).hexdigest()}"'
+_CSS_NOT_MODIFIED_HEADERS = (("ETag", _CSS_ETAG), ("Cache-Control", CSS_CACHE_CONTROL))
+_CSS_HEADERS = (
+    ("Content-Type", "text/css; charset=utf-8"),
+    ("Content-Length", str(len(_CSS_BYTES))),
+) + _CSS_NOT_MODIFIED_HEADERS
+
+
 def text_response(start_response, status: str, payload: bytes, content_type: str, extra_headers=None):
     headers = [("Content-Type", content_type), ("Content-Length", str(len(payload)))]
     if extra_headers:
@@ -125,86 +503,93 @@ def text_response(start_response, status: str, payload: bytes, content_type: str
 
 
 def html_response(start_response, status: str, body: str):
-    return text_response(start_response, status, body.encode("utf-8"), "text/html; charset=utf-8")
+    return text_response(start_response, status, body.encode("utf-8"), HTML_CONTENT_TYPE)
 
 
 def do_redirect(start_response, location: str):
     start_response("302 Found", [("Location", location), ("Content-Length", "0")])
-    return [b""]
+    return _EMPTY_BODY
 
 
-def parse_form(environ) -> dict:
-    length = int(environ.get("CONTENT_LENGTH") or "0")
-    body = environ.get("wsgi.input").read(length).decode("utf-8") if length > 0 else ""
-    parsed = parse_qs(body)
-    return {key: values[0] if values else "" for key, values in parsed.items()}
-
-
-def app(environ, start_response):
-    path = environ.get("PATH_INFO", "/")
-    method = environ.get("REQUEST_METHOD", "GET").upper()
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in (etag, "*"):
+            return True
+    return False
 
-    if path == "/static/style.css":
-        css_path = os.path.join(BASE_DIR, "static", "style.css")
-        with open(css_path, "rb") as fh:
-            payload = fh.read()
-        return text_response(start_response, "200 OK", payload, "text/css; charset=utf-8")
 
-    if path == "/" and method == "GET":
-        content = """
-<section class='hero'>
-  <h1>Paste the URL to be shortened</h1>
-  <p>Simple, fast, and reliable short link service.</p>
-</section>
-<form method='post' class='card form-card'>
-  <input id='url' name='url' type='text' placeholder='Enter the link here' required>
-  <button type='submit'>Shorten URL</button>
-</form>
-<p class='helper'>Example valid input: <code>https://example.com</code> or <code>example.com/page</code></p>
-"""
-        return html_response(start_response, "200 OK", html_page("Free URL Shortener", content))
-
-    if path == "/" and method == "POST":
-        form = parse_form(environ)
-        original = normalize_url(form.get("url", ""))
-        if not original:
-            return do_redirect(start_response, "/url-error.php")
-
-        code = insert_short_url(original)
-        host = environ.get("HTTP_HOST", "localhost:5000")
-        scheme = environ.get("wsgi.url_scheme", "http")
-        short_url = f"{scheme}://{host}/{code}"
-
-        content = f"""
+def parse_form(environ) -> str:
+    length = int(environ.get("CONTENT_LENGTH") or "0")
+    if length <= 0:
+        return ""
+    body = environ["wsgi.input"].read(length).decode("utf-8", "replace")
+    try:
+        fields = parse_qsl(body, max_num_fields=MAX_FORM_FIELDS)
+    except ValueError:
+        return ""
+    # Only the url field is used, so stop at the first one.
+    for key, value in fields:
+        if key == "url":
+            return value
+    return ""
+
+
+def _handle_css(environ, start_response):
+    if etag_matches(environ.get("HTTP_IF_NONE_MATCH", ""), _CSS_ETAG):
+        start_response("304 Not Modified", list(_CSS_NOT_MODIFIED_HEADERS))
+        return _EMPTY_BODY
+    start_response("200 OK", list(_CSS_HEADERS))
+    return _CSS_BODY
+
+
+def _handle_home(environ, start_response):
+    start_response("200 OK", list(_HOME_HEADERS))
+    return _HOME_BODY
+
+
+def _handle_submit(environ, start_response):
+    get = environ.get
+    original = normalize_url(parse_form(environ))
+    if not original:
+        return do_redirect(start_response, "/url-error.php")
+
+    code = insert_short_url(original)
+    host = get("HTTP_HOST", "localhost:5000")
+    scheme = get("wsgi.url_scheme", "http")
+    short_url = f"{scheme}://{host}/{code}"
+    # Codes come from CODE_ALPHABET, so the short URL is HTML-safe whenever
+    # the scheme and host are.
+    if scheme in ("http", "https") and _HOST_RE.fullmatch(host):
+        safe_short_url = short_url
+    else:
+        safe_short_url = html.escape(short_url)
+
+    content = f"""
 <section class='hero'>
   <h1>Your shortened URL</h1>
 </section>
 <div class='card result-card'>
   <p><strong>Original URL:</strong> {html.escape(original)}</p>
-  <p><strong>Short URL:</strong> <a href='{html.escape(short_url)}'>{html.escape(short_url)}</a></p>
+  <p><strong>Short URL:</strong> <a href='{safe_short_url}'>{safe_short_url}</a></p>
   <div class='actions'>
     <a class='btn secondary' href='/'>Create another</a>
   </div>
 </div>
 """
-        return html_response(start_response, "200 OK", html_page("Your short URL", content))
+    return html_response(start_response, "200 OK", html_page("Your short URL", content))
 
-    if path == "/url-error.php":
-        content = """
-<section class='hero'>
-  <h1>Invalid URL</h1>
-</section>
-<div class='card error-card'>
-  <p>The URL you entered is not valid.</p>
-  <p>Please make sure it starts with <code>http://</code> or <code>https://</code> (or include a valid domain name).</p>
-  <a class='btn' href='/'>Try Again</a>
-</div>
-"""
-        return html_response(start_response, "400 Bad Request", html_page("URL error", content))
 
-    if path == "/stats":
-        total = count_urls()
-        content = f"""
+def _handle_url_error(environ, start_response):
+    start_response("400 Bad Request", list(_ERROR_HEADERS))
+    return _ERROR_BODY
+
+
+def _handle_stats(environ, start_response):
+    total = count_urls()
+    content = f"""
 <section class='hero'>
   <h1>Service Stats</h1>
 </section>
@@ -213,29 +598,76 @@ def app(environ, start_response):
   <a class='btn secondary' href='/'>Back to shortener</a>
 </div>
 """
-        return html_response(start_response, "200 OK", html_page("Stats", content))
+    return html_response(start_response, "200 OK", html_page("Stats", content))
+
 
-    code = path.lstrip("/")
-    if code and "/" not in code:
+def _handle_code(environ, start_response):
+    code = environ.get("PATH_INFO", "/").lstrip("/")
+    # Paths with characters generate_code never emits (probes for
+    # /wp-login.php and the like) cannot match, so skip the lookup.
+    if code and _CODE_CHARS.issuperset(code):
         target = lookup_original_url(code)
         if target:
             return do_redirect(start_response, target)
 
-    content = """
-<section class='hero'>
-  <h1>404 - Link not found</h1>
-</section>
-<div class='card error-card'>
-  <p>This short URL does not exist or has expired.</p>
-  <a class='btn' href='/'>Create new short URL</a>
-</div>
-"""
-    return html_response(start_response, "404 Not Found", html_page("404 Not Found", content))
+    start_response("404 Not Found", list(_NOT_FOUND_HEADERS))
+    return _NOT_FOUND_BODY
+
+
+# These paths answer every request method.
+_PATH_ROUTES = {
+    "/static/style.css": _handle_css,
+    "/url-error.php": _handle_url_error,
+    "/stats": _handle_stats,
+}
+_ROUTES = {
+    ("GET", "/"): _handle_home,
+    ("POST", "/"): _handle_submit,
+}
+
+
+def app(environ, start_response):
+    get = environ.get
+    path = get("PATH_INFO", "/")
+    handler = _PATH_ROUTES.get(path)
+    if handler is None:
+        # Anything that is not a fixed route is treated as a short code.
+        handler = _ROUTES.get((get("REQUEST_METHOD", "GET").upper(), path), _handle_code)
+    return handler(environ, start_response)
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    # socketserver defaults to a listen backlog of 5, which resets
+    # connections under even modest concurrency.
+    request_queue_size = SERVER_LISTEN_BACKLOG
+
+
+def serve(host: str, port: int, dev: bool = False) -> None:
+    if dev:
+        # Single-threaded reference server, handy for debugging.
+        with make_server(host, port, app) as server:
+            print(f"Serving (dev) on http://{host}:{port}")
+            server.serve_forever()
+        return
+
+    try:
+        import waitress
+    except ImportError:
+        waitress = None
+
+    if waitress is not None:
+        # waitress buffers whole requests and responses, so slow clients
+        # never hold a worker thread.
+        waitress.serve(app, host=host, port=port, threads=SERVER_THREADS)
+        return
+
+    with make_server(host, port, app, server_class=ThreadingWSGIServer) as server:
+        print(f"Serving on http://{host}:{port}")
+        server.serve_forever()
 
 
 if __name__ == "__main__":
     init_db()
     port = int(os.getenv("PORT", "5000"))
-    with make_server("0.0.0.0", port, app) as server:
-        print(f"Serving on http://0.0.0.0:{port}")
-        server.serve_forever()
+    serve("0.0.0.0", port, dev="--dev" in sys.argv[1:])
@@ -1,5 +1,7 @@
+import contextlib
 import io
 import os
+import sqlite3
 import tempfile
 import unittest
 from urllib.parse import urlencode
@@ -14,9 +16,35 @@ class ShortUrlTests(unittest.TestCase):
         shortener.init_db()
 
     def tearDown(self):
+        shortener.flush_clicks()
+        shortener.close_pool()
+        for suffix in ("", "-wal", "-shm"):
+            path = self.tmp_db.name + suffix
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def make_legacy_db(self, rows):
+        # Schema as created before original_url was unique.
         os.unlink(self.tmp_db.name)
+        shortener.close_pool()
+        with sqlite3.connect(self.tmp_db.name) as db:
+            db.execute(
+                """
+                CREATE TABLE urls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    code TEXT UNIQUE NOT NULL,
+                    original_url TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    clicks INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            db.execute("CREATE INDEX idx_urls_code ON urls(code)")
+            db.execute("CREATE INDEX idx_urls_original ON urls(original_url)")
+            db.executemany("INSERT INTO urls (code, original_url, created_at) VALUES (?, ?, ?)", rows)
+        db.close()
 
-    def request(self, path="/", method="GET", form=None):
+    def request(self, path="/", method="GET", form=None, headers=None):
         body = urlencode(form or {}).encode("utf-8")
         environ = {
             "REQUEST_METHOD": method,
@@ -26,6 +54,7 @@ class ShortUrlTests(unittest.TestCase):
             "HTTP_HOST": "localhost:5000",
             "wsgi.url_scheme": "http",
         }
+        environ.update(headers or {})
         state = {"status": "", "headers": {}}
 
         def start_response(status, headers):
@@ -40,28 +69,168 @@ class ShortUrlTests(unittest.TestCase):
         self.assertTrue(status.startswith("200"))
         self.assertIn(b"Paste the URL to be shortened", payload)
 
+    def test_stylesheet_revalidates_with_etag(self):
+        status, headers, payload = self.request("/static/style.css")
+        self.assertTrue(status.startswith("200"))
+        self.assertTrue(payload)
+        etag = headers.get("ETag")
+        self.assertTrue(etag)
+
+        status, headers, payload = self.request("/static/style.css", headers={"HTTP_IF_NONE_MATCH": etag})
+        self.assertTrue(status.startswith("304"))
+        self.assertEqual(headers.get("ETag"), etag)
+        self.assertEqual(payload, b"")
+
     def test_invalid_url_goes_to_error_page(self):
         status, headers, _ = self.request("/", method="POST", form={"url": "ftp://bad-url"})
         self.assertTrue(status.startswith("302"))
         self.assertEqual(headers.get("Location"), "/url-error.php")
 
+    def test_oversized_form_goes_to_error_page(self):
+        form = {f"field{i}": "x" for i in range(shortener.MAX_FORM_FIELDS)}
+        form["url"] = "example.com"
+        status, headers, _ = self.request("/", method="POST", form=form)
+        self.assertTrue(status.startswith("302"))
+        self.assertEqual(headers.get("Location"), "/url-error.php")
+
     def test_valid_url_creates_shortened_url(self):
         status, _, payload = self.request("/", method="POST", form={"url": "example.com"})
         self.assertTrue(status.startswith("200"))
         self.assertIn(b"Your shortened URL", payload)
 
+    def test_url_count_tracks_inserts(self):
+        self.assertEqual(shortener.count_urls(), 0)
+        shortener.insert_short_url("https://a.com")
+        shortener.insert_short_url("https://b.com")
+        self.assertEqual(shortener.count_urls(), 2)
+        shortener.init_db()
+        self.assertEqual(shortener.count_urls(), 2)
+
+    def test_resubmitting_url_returns_same_code(self):
+        first = shortener.insert_short_url("https://example.com/again")
+        second = shortener.insert_short_url("https://example.com/again")
+        self.assertEqual(first, second)
+        self.assertEqual(shortener.count_urls(), 1)
+
+    def test_code_collision_is_retried(self):
+        first = shortener.insert_short_url("https://example.com/one")
+        codes = iter([first, "Zz9Zz9"])
+        original = shortener.generate_code
+        shortener.generate_code = lambda: next(codes)
+        try:
+            second = shortener.insert_short_url("https://example.com/two")
+        finally:
+            shortener.generate_code = original
+        self.assertEqual(second, "Zz9Zz9")
+        self.assertEqual(shortener.lookup_original_url(first), "https://example.com/one")
+
+    def test_untrusted_host_is_escaped(self):
+        status, _, payload = self.request(
+            "/", method="POST", form={"url": "example.com"}, headers={"HTTP_HOST": "evil'><b>"}
+        )
+        self.assertTrue(status.startswith("200"))
+        self.assertNotIn(b"evil'><b>", payload)
+        self.assertIn(b"evil&#x27;&gt;&lt;b&gt;", payload)
+
+    def test_init_db_keeps_legacy_duplicate_urls(self):
+        self.make_legacy_db(
+            [
+                ("dup001", "https://d.com", "2024-01-01T00:00:00"),
+                ("dup002", "https://d.com", "2024-01-02T00:00:00"),
+            ]
+        )
+        shortener.init_db()
+        self.assertEqual(shortener.lookup_original_url("dup001"), "https://d.com")
+        self.assertEqual(shortener.lookup_original_url("dup002"), "https://d.com")
+        self.assertIn(shortener.insert_short_url("https://d.com"), {"dup001", "dup002"})
+        code = shortener.insert_short_url("https://e.com")
+        self.assertEqual(shortener.insert_short_url("https://e.com"), code)
+        self.assertEqual(shortener.count_urls(), 3)
+
+    def test_init_db_converts_legacy_timestamps(self):
+        self.make_legacy_db(
+            [
+                ("old001", "https://old.com", "2025-10-14T04:22:33.123456"),
+                ("old002", "https://older.com", "2025-10-14T04:22:33"),
+                ("old003", "https://broken.com", "not-a-date"),
+            ]
+        )
+        shortener.init_db()
+        shortener.insert_short_url("https://new.com")
+        with shortener.get_conn() as db:
+            rows = db.execute("SELECT code, created_at FROM urls ORDER BY id").fetchall()
+        self.assertEqual(int(rows[0]["created_at"]), 1760415753)
+        self.assertEqual(int(rows[1]["created_at"]), 1760415753)
+        self.assertEqual(rows[2]["created_at"], "not-a-date")
+        self.assertTrue(str(rows[3]["created_at"]).isdigit())
+
+    def test_oversized_url_is_not_cached(self):
+        long_url = "https://example.com/" + "a" * shortener.NORMALIZE_CACHE_MAX_INPUT
+        code = shortener.insert_short_url(long_url)
+        self.assertEqual(shortener.lookup_original_url(code), long_url)
+        shortener.prime_url_cache()
+        self.assertIsNone(shortener._url_cache.get(long_url))
+        self.assertIsNone(shortener._code_cache.get(code))
+        self.assertEqual(shortener.insert_short_url(long_url), code)
+
     def test_redirect_short_code(self):
         code = shortener.insert_short_url("https://example.com/page")
         status, headers, _ = self.request(f"/{code}")
         self.assertTrue(status.startswith("302"))
         self.assertEqual(headers.get("Location"), "https://example.com/page")
 
+    def test_clicks_are_flushed_in_batches(self):
+        code = shortener.insert_short_url("https://example.com/clicks")
+        for _ in range(3):
+            self.request(f"/{code}")
+        shortener.flush_clicks()
+        with shortener.get_conn() as db:
+            row = db.execute("SELECT clicks FROM urls WHERE code = ?", (code,)).fetchone()
+        self.assertEqual(row["clicks"], 3)
+
+    def test_unknown_path_is_not_found(self):
+        for path in ("/zzzzzz", "/wp-login.php", "/a/b"):
+            status, _, payload = self.request(path)
+            self.assertTrue(status.startswith("404"))
+            self.assertIn(b"404 - Link not found", payload)
+
+    def test_failed_click_flush_keeps_counts(self):
+        code = shortener.insert_short_url("https://example.com/locked")
+
+        @contextlib.contextmanager
+        def locked_conn():
+            raise sqlite3.OperationalError("database is locked")
+            yield
+
+        get_conn, threshold = shortener.get_conn, shortener.CLICK_FLUSH_THRESHOLD
+        shortener.get_conn, shortener.CLICK_FLUSH_THRESHOLD = locked_conn, 1
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                for _ in range(2):
+                    status, _, _ = self.request(f"/{code}")
+                    self.assertTrue(status.startswith("302"))
+        finally:
+            shortener.get_conn, shortener.CLICK_FLUSH_THRESHOLD = get_conn, threshold
+
+        shortener.flush_clicks()
+        with shortener.get_conn() as db:
+            row = db.execute("SELECT clicks FROM urls WHERE code = ?", (code,)).fetchone()
+        self.assertEqual(row["clicks"], 2)
+
     def test_stats_page(self):
         shortener.insert_short_url("https://a.com")
         status, _, payload = self.request("/stats")
         self.assertTrue(status.startswith("200"))
         self.assertIn(b"Total short URLs created", payload)
 
+    def test_connections_are_reused(self):
+        shortener.insert_short_url("https://a.com")
+        before = shortener.pool_stats()
+        shortener.count_urls()
+        after = shortener.pool_stats()
+        self.assertEqual(after["opens"], before["opens"])
+        self.assertEqual(after["reuses"], before["reuses"] + 1)
+
 
 if __name__ == "__main__":
     unittest.main()